@@ -1,11 +1,19 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import sqlite3
+import io
+import threading
 from datetime import datetime
 import plotly.graph_objects as go
+
+TRANSACTION_COLUMNS = ['Date', 'Category', 'Amount', 'Description', 'Type', 'User']
+TRANSACTION_DTYPES = {'Amount': 'float64', 'Type': 'category', 'Category': 'category'}
+
 def main():
     st.title("Personal Finance Manager 💰")
+    init_schema()
 
     # Initialize session state
     if 'user' not in st.session_state:
@@ -13,7 +21,7 @@ def main():
     if 'transactions' not in st.session_state:
         st.session_state.transactions = load_from_database()
     if 'savings_goal' not in st.session_state:
-        st.session_state.savings_goal = load_savings_goal_from_database()
+        st.session_state.savings_goal = load_savings_goal_from_database(st.session_state.user)
 
     # Sidebar navigation
     page = st.sidebar.selectbox("Navigate", ["Dashboard", "Transactions", "Budget Management", "Savings Goals", "Automated Payments", "Loans", "Data Export"])
@@ -33,16 +41,18 @@ def main():
     elif page == "Data Export":
         data_export()
 
+@st.fragment
 def show_dashboard():
     st.header("Financial Dashboard")
     
-    if st.session_state.transactions.empty:
+    totals = totals_by_type()
+    if totals.empty:
         st.warning("No transactions available. Please add transactions or upload a CSV file.")
         return
 
     # Key Metrics
-    total_income = st.session_state.transactions[st.session_state.transactions['Type'] == 'Income']['Amount'].sum()
-    total_expenses = st.session_state.transactions[st.session_state.transactions['Type'] == 'Expense']['Amount'].sum()
+    total_income = totals.get('Income', 0.0)
+    total_expenses = totals.get('Expense', 0.0)
     net_savings = total_income - total_expenses
 
     col1, col2, col3 = st.columns(3)
@@ -52,27 +62,29 @@ def show_dashboard():
 
     # Monthly Summary
     st.subheader("Monthly Summary")
-    monthly_data = st.session_state.transactions.copy()
-    monthly_data['Date'] = pd.to_datetime(monthly_data['Date'])
-    monthly_data['Month'] = monthly_data['Date'].dt.to_period('M').astype(str)
-    monthly_summary = monthly_data.groupby(['Month', 'Type'])['Amount'].sum().unstack(fill_value=0).reindex(columns=['Income', 'Expense'], fill_value=0)
-    
+    monthly_summary = monthly_totals()
     monthly_summary['Net'] = monthly_summary['Income'] - monthly_summary['Expense']
-    monthly_summary = monthly_summary.reset_index()
-    fig_monthly = px.bar(monthly_summary, x='Month', y=['Income', 'Expense', 'Net'],
-                         title='Monthly Income, Expenses, and Net Savings',
-                         labels={'value': 'Amount', 'variable': 'Type'})
-    st.plotly_chart(fig_monthly)
+    st.plotly_chart(build_monthly_bar(monthly_summary))
 
     # Expense Breakdown Pie Chart
     st.subheader("Expense Breakdown")
-    expense_data = st.session_state.transactions[st.session_state.transactions['Type'] == 'Expense']
-    if not expense_data.empty:
-        fig_pie = px.pie(expense_data, values='Amount', names='Category', title='Expense Breakdown')
-        st.plotly_chart(fig_pie)
+    expense_by_category = expenses_by_category()
+    if not expense_by_category.empty:
+        st.plotly_chart(build_expense_pie(expense_by_category))
     else:
         st.info("No expenses to display.")
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_monthly_bar(monthly_summary):
+    return px.bar(monthly_summary, x='Month', y=['Income', 'Expense', 'Net'],
+                  title='Monthly Income, Expenses, and Net Savings',
+                  labels={'value': 'Amount', 'variable': 'Type'})
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_expense_pie(expense_by_category):
+    return px.pie(expense_by_category, values='Amount', names='Category', title='Expense Breakdown')
+
+@st.fragment
 def show_transactions():
     st.header("Transactions")
     
@@ -85,26 +97,25 @@ def show_transactions():
     transaction_type = st.selectbox("Type", ["Income", "Expense"])
 
     if st.button("Add Transaction"):
-        new_transaction = pd.DataFrame({
-            'Date': [date],
-            'Category': [category],
-            'Amount': [amount],
-            'Description': [description],
-            'Type': [transaction_type],
-            'User': [st.session_state.user]
-        })
-        save_to_database(new_transaction)
-        st.session_state.transactions = load_from_database()
+        new_transaction = (date.isoformat(), category, amount, description, transaction_type, st.session_state.user)
+        if save_to_database(new_transaction):
+            append_transaction(new_transaction)
         st.success("Transaction added successfully!")
         st.rerun()
 
     # Display transaction history
     st.subheader("Transaction History")
     if not st.session_state.transactions.empty:
-        st.dataframe(st.session_state.transactions.sort_values('Date', ascending=False))
+        st.dataframe(sorted_transactions(st.session_state.transactions),
+                     column_config={'Date': st.column_config.DateColumn()})
     else:
         st.info("No transactions available.")
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def sorted_transactions(transactions):
+    return transactions.sort_values('Date', ascending=False)
+
+@st.fragment
 def budget_management():
     st.header("Budget Management")
     
@@ -126,32 +137,36 @@ def budget_management():
     
     # Budget comparison
     st.subheader("Budget vs Actual Spending")
-    actual_spending = st.session_state.transactions[st.session_state.transactions['Type'] == 'Expense'].groupby('Category')['Amount'].sum()
+    actual_spending = expenses_by_category().set_index('Category')['Amount']
     
-    comparison_data = []
-    for category, budget in new_budget_data.items():
-        actual = actual_spending.get(category, 0)
-        comparison_data.append({
-            'Category': category,
-            'Budget': budget,
-            'Actual': actual,
-            'Difference': budget - actual
-        })
+    budget_categories = list(new_budget_data)
+    budgets = np.fromiter(new_budget_data.values(), dtype=np.float64, count=len(budget_categories))
+    actuals = actual_spending.reindex(budget_categories, fill_value=0.0).to_numpy(dtype=np.float64)
+    comparison_df = pd.DataFrame({
+        'Category': budget_categories,
+        'Budget': budgets,
+        'Actual': actuals,
+        'Difference': budgets - actuals
+    })
+    st.plotly_chart(build_budget_comparison(comparison_df))
     
-    comparison_df = pd.DataFrame(comparison_data)
+    # Alerts
+    st.subheader("Budget Alerts")
+    over_mask = comparison_df['Actual'].to_numpy() > comparison_df['Budget'].to_numpy()
+    overspent = comparison_df.loc[over_mask]
+    for category, budget, actual in zip(overspent['Category'], overspent['Budget'], overspent['Actual']):
+        st.warning(f"Overspending in {category}: Budget ${budget:.2f}, Actual ${actual:.2f}")
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_budget_comparison(comparison_df):
     fig_comparison = go.Figure(data=[
         go.Bar(name='Budget', x=comparison_df['Category'], y=comparison_df['Budget']),
         go.Bar(name='Actual', x=comparison_df['Category'], y=comparison_df['Actual'])
     ])
     fig_comparison.update_layout(title='Budget vs Actual Spending', barmode='group')
-    st.plotly_chart(fig_comparison)
-    
-    # Alerts
-    st.subheader("Budget Alerts")
-    for _, row in comparison_df.iterrows():
-        if row['Actual'] > row['Budget']:
-            st.warning(f"Overspending in {row['Category']}: Budget ${row['Budget']:.2f}, Actual ${row['Actual']:.2f}")
+    return fig_comparison
 
+@st.fragment
 def savings_goals():
     st.header("Savings Goals")
     
@@ -164,8 +179,9 @@ def savings_goals():
         st.success("Savings goal updated successfully!")
     
     # Calculate total savings
-    total_income = st.session_state.transactions[st.session_state.transactions['Type'] == 'Income']['Amount'].sum()
-    total_expenses = st.session_state.transactions[st.session_state.transactions['Type'] == 'Expense']['Amount'].sum()
+    totals = totals_by_type()
+    total_income = totals.get('Income', 0.0)
+    total_expenses = totals.get('Expense', 0.0)
     total_savings = total_income - total_expenses
 
     # Load automated payments and calculate expected expenses
@@ -183,6 +199,7 @@ def savings_goals():
     st.write(f"Current savings: ${adjusted_savings:.2f}")
     st.write(f"Progress towards goal: {progress * 100:.1f}%")
 
+@st.fragment
 def automated_payments():
     st.header("Automated Payments")
     
@@ -194,13 +211,7 @@ def automated_payments():
     next_payment_date = st.date_input("Next Payment Date", datetime.now().date())
 
     if st.button("Add Automated Payment"):
-        new_payment = pd.DataFrame({
-            'Name': [payment_name],
-            'Amount': [amount],
-            'Frequency': [frequency],
-            'NextPaymentDate': [next_payment_date],
-            'User': [st.session_state.user]
-        })
+        new_payment = (payment_name, amount, frequency, next_payment_date.isoformat(), st.session_state.user)
         save_automated_payment_to_database(new_payment)
         st.success("Automated payment added successfully!")
 
@@ -212,6 +223,7 @@ def automated_payments():
     else:
         st.info("No automated payments available.")
 
+@st.fragment
 def loans():
     st.header("Loans Management")
     
@@ -223,28 +235,15 @@ def loans():
     due_date = st.date_input("Due Date", datetime.now().date())
 
     if st.button("Add Loan"):
-        new_loan = pd.DataFrame({
-            'Name': [loan_name],
-            'Amount': [amount],
-            'Type': [loan_type],
-            'DueDate': [due_date],
-            'User': [st.session_state.user]
-        })
+        new_loan = (loan_name, amount, loan_type, due_date.isoformat(), st.session_state.user)
         save_loan_to_database(new_loan)
         st.success("Loan added successfully!")
 
         # If the loan is given, add it as an "Other Expense" transaction
         if loan_type == "Given":
-            new_transaction = pd.DataFrame({
-                'Date': [datetime.now().date()],
-                'Category': ["Other"],
-                'Amount': [amount],
-                'Description': [f"Loan Given: {loan_name}"],
-                'Type': ["Expense"],
-                'User': [st.session_state.user]
-            })
-            save_to_database(new_transaction)
-            st.session_state.transactions = load_from_database()
+            new_transaction = (datetime.now().date().isoformat(), "Other", amount, f"Loan Given: {loan_name}", "Expense", st.session_state.user)
+            if save_to_database(new_transaction):
+                append_transaction(new_transaction)
             st.success("Loan recorded as an expense in transactions!")
 
     # Display loans
@@ -255,11 +254,20 @@ def loans():
     else:
         st.info("No loans available.")
 
+def append_transaction(transaction):
+    new_row = pd.DataFrame([transaction], columns=TRANSACTION_COLUMNS)
+    new_row['Date'] = pd.to_datetime(new_row['Date'])
+    st.session_state.transactions = with_transaction_dtypes(pd.concat([st.session_state.transactions, new_row], ignore_index=True))
+
+def with_transaction_dtypes(df):
+    return df.astype(TRANSACTION_DTYPES)
+
+@st.fragment
 def data_export():
     st.header("Export Data")
     
     if st.button("Export to CSV"):
-        csv = st.session_state.transactions.to_csv(index=False)
+        csv = transactions_csv(st.session_state.transactions)
         st.download_button(
             label="Download CSV",
             data=csv,
@@ -267,169 +275,216 @@ def data_export():
             mime="text/csv"
         )
 
-def save_to_database(df):
+@st.cache_data(max_entries=4, show_spinner=False)
+def transactions_csv(transactions):
+    buf = io.BytesIO()
+    transactions.to_csv(buf, index=False)
+    return buf.getvalue()
+
+def open_connection():
+    conn = sqlite3.connect('finance_data.db', check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA cache_size=-65536')
+    conn.execute('PRAGMA mmap_size=268435456')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+@st.cache_resource
+def get_conn():
+    # Writer connection
+    return open_connection()
+
+@st.cache_resource
+def get_read_conn():
+    # Read-only connection for queries
+    conn = open_connection()
+    conn.execute('PRAGMA query_only=ON')
+    return conn
+
+@st.cache_resource
+def get_write_lock():
+    return threading.Lock()
+
+@st.cache_resource
+def create_schema():
+    conn = get_conn()
+    conn.executescript('''
+    CREATE TABLE IF NOT EXISTS transactions
+    (Date TEXT, Category TEXT, Amount REAL, Description TEXT, Type TEXT, User TEXT);
+    CREATE TABLE IF NOT EXISTS budget
+    (Category TEXT PRIMARY KEY, Amount REAL);
+    CREATE TABLE IF NOT EXISTS savings_goal
+    (User TEXT PRIMARY KEY, Goal REAL);
+    CREATE TABLE IF NOT EXISTS automated_payments
+    (Name TEXT, Amount REAL, Frequency TEXT, NextPaymentDate TEXT, User TEXT);
+    CREATE TABLE IF NOT EXISTS loans
+    (Name TEXT, Amount REAL, Type TEXT, DueDate TEXT, User TEXT);
+    CREATE INDEX IF NOT EXISTS idx_tx_type_cat_amount ON transactions(Type, Category, Amount);
+    ''')
+
+def init_schema():
+    try:
+        create_schema()
+    except sqlite3.Error as e:
+        st.error(f"An error occurred while creating the database tables: {e}")
+
+def save_to_database(transaction):
     try:
-        conn = sqlite3.connect('finance_data.db')
-        df.to_sql('transactions', conn, if_exists='append', index=False)
-        conn.close()
+        conn = get_conn()
+        with get_write_lock(), conn:
+            conn.execute('INSERT INTO transactions (Date, Category, Amount, Description, Type, User) VALUES (?, ?, ?, ?, ?, ?)', transaction)
+        read_transactions.clear()
+        read_totals_by_type.clear()
+        read_monthly_totals.clear()
+        read_expenses_by_category.clear()
+        return True
     except sqlite3.Error as e:
         st.error(f"An error occurred while saving to the database: {e}")
+        return False
+
+@st.cache_data(ttl=600, show_spinner=False)
+def read_transactions():
+    conn = get_read_conn()
+    return pd.read_sql_query('SELECT Date, Category, Amount, Description, Type, User FROM transactions', conn,
+                             parse_dates=['Date'], dtype=TRANSACTION_DTYPES)
 
 def load_from_database():
     try:
-        conn = sqlite3.connect('finance_data.db')
-        cursor = conn.cursor()
-        
-        # Create table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions
-        (Date TEXT, Category TEXT, Amount REAL, Description TEXT, Type TEXT, User TEXT)
-        ''')
-        
-        df = pd.read_sql('SELECT * FROM transactions', conn)
-        conn.close()
-        return df
+        return read_transactions()
     except sqlite3.Error as e:
         st.error(f"An error occurred while loading from the database: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(columns=TRANSACTION_COLUMNS)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def read_totals_by_type():
+    conn = get_read_conn()
+    return pd.read_sql('SELECT Type, SUM(Amount) AS Amount FROM transactions GROUP BY Type', conn, index_col='Type')['Amount']
+
+def totals_by_type():
+    try:
+        return read_totals_by_type()
+    except sqlite3.Error as e:
+        st.error(f"An error occurred while loading totals: {e}")
+        return pd.Series(dtype=float)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def read_monthly_totals():
+    conn = get_read_conn()
+    # Dates are stored as ISO 'YYYY-MM-DD', so the month is the first 7 characters
+    return pd.read_sql('''
+    SELECT substr(Date, 1, 7) AS Month,
+           SUM(CASE WHEN Type = 'Income' THEN Amount ELSE 0 END) AS Income,
+           SUM(CASE WHEN Type = 'Expense' THEN Amount ELSE 0 END) AS Expense
+    FROM transactions
+    GROUP BY Month
+    ORDER BY Month
+    ''', conn)
+
+def monthly_totals():
+    try:
+        return read_monthly_totals()
+    except sqlite3.Error as e:
+        st.error(f"An error occurred while loading monthly totals: {e}")
+        return pd.DataFrame(columns=['Month', 'Income', 'Expense'])
+
+@st.cache_data(ttl=600, show_spinner=False)
+def read_expenses_by_category():
+    conn = get_read_conn()
+    return pd.read_sql("SELECT Category, SUM(Amount) AS Amount FROM transactions WHERE Type = 'Expense' GROUP BY Category", conn)
+
+def expenses_by_category():
+    try:
+        return read_expenses_by_category()
+    except sqlite3.Error as e:
+        st.error(f"An error occurred while loading expenses by category: {e}")
+        return pd.DataFrame(columns=['Category', 'Amount'])
 
 def save_budget_to_database(budget_data):
     try:
-        conn = sqlite3.connect('finance_data.db')
-        cursor = conn.cursor()
-        
-        # Create budget table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS budget
-        (Category TEXT PRIMARY KEY, Amount REAL)
-        ''')
-        
-        # Insert or update budget data
-        for category, amount in budget_data.items():
-            cursor.execute('INSERT OR REPLACE INTO budget (Category, Amount) VALUES (?, ?)', (category, amount))
+        conn = get_conn()
         
-        conn.commit()
-        conn.close()
+        # Insert or update all budget rows in one transaction
+        with get_write_lock(), conn:
+            conn.executemany('INSERT OR REPLACE INTO budget (Category, Amount) VALUES (?, ?)', list(budget_data.items()))
+        read_budget.clear()
     except sqlite3.Error as e:
         st.error(f"An error occurred while saving the budget: {e}")
 
+@st.cache_data(ttl=600, show_spinner=False)
+def read_budget():
+    conn = get_read_conn()
+    return dict(conn.execute('SELECT Category, Amount FROM budget').fetchall())
+
 def load_budget_from_database():
     try:
-        conn = sqlite3.connect('finance_data.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM budget')
-        budget_data = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        conn.close()
-        return budget_data
+        return read_budget()
     except sqlite3.Error as e:
         st.error(f"An error occurred while loading the budget: {e}")
         return {}
 
 def save_savings_goal_to_database(goal):
     try:
-        conn = sqlite3.connect('finance_data.db')
-        cursor = conn.cursor()
-        
-        # Create savings_goal table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS savings_goal
-        (User TEXT PRIMARY KEY, Goal REAL)
-        ''')
+        conn = get_conn()
         
         # Insert or update savings goal
-        cursor.execute('INSERT OR REPLACE INTO savings_goal (User, Goal) VALUES (?, ?)', (st.session_state.user, goal))
-        
-        conn.commit()
-        conn.close()
+        with get_write_lock(), conn:
+            conn.execute('INSERT OR REPLACE INTO savings_goal (User, Goal) VALUES (?, ?)', (st.session_state.user, goal))
+        read_savings_goal.clear()
     except sqlite3.Error as e:
         st.error(f"An error occurred while saving the savings goal: {e}")
 
-def load_savings_goal_from_database():
+@st.cache_data(ttl=600, show_spinner=False)
+def read_savings_goal(user):
+    conn = get_read_conn()
+    result = conn.execute('SELECT Goal FROM savings_goal WHERE User = ?', (user,)).fetchone()
+    return result[0] if result else 0
+
+def load_savings_goal_from_database(user):
     try:
-        conn = sqlite3.connect('finance_data.db')
-        cursor = conn.cursor()
-        
-        # Create savings_goal table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS savings_goal
-        (User TEXT PRIMARY KEY, Goal REAL)
-        ''')
-        
-        cursor.execute('SELECT Goal FROM savings_goal WHERE User = ?', (st.session_state.user,))
-        result = cursor.fetchone()
-        
-        conn.close()
-        return result[0] if result else 0
+        return read_savings_goal(user)
     except sqlite3.Error as e:
         st.error(f"An error occurred while loading the savings goal: {e}")
         return 0
 
-def save_automated_payment_to_database(df):
+def save_automated_payment_to_database(payment):
     try:
-        conn = sqlite3.connect('finance_data.db')
-        cursor = conn.cursor()
-        
-        # Create automated_payments table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS automated_payments
-        (Name TEXT, Amount REAL, Frequency TEXT, NextPaymentDate TEXT, User TEXT)
-        ''')
-        
-        df.to_sql('automated_payments', conn, if_exists='append', index=False)
-        conn.close()
+        conn = get_conn()
+        with get_write_lock(), conn:
+            conn.execute('INSERT INTO automated_payments (Name, Amount, Frequency, NextPaymentDate, User) VALUES (?, ?, ?, ?, ?)', payment)
+        read_automated_payments.clear()
     except sqlite3.Error as e:
         st.error(f"An error occurred while saving the automated payment: {e}")
 
+@st.cache_data(ttl=600, show_spinner=False)
+def read_automated_payments():
+    conn = get_read_conn()
+    return pd.read_sql('SELECT * FROM automated_payments', conn)
+
 def load_automated_payments_from_database():
     try:
-        conn = sqlite3.connect('finance_data.db')
-        cursor = conn.cursor()
-        
-        # Create automated_payments table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS automated_payments
-        (Name TEXT, Amount REAL, Frequency TEXT, NextPaymentDate TEXT, User TEXT)
-        ''')
-        
-        df = pd.read_sql('SELECT * FROM automated_payments', conn)
-        conn.close()
-        return df
+        return read_automated_payments()
     except sqlite3.Error as e:
         st.error(f"An error occurred while loading automated payments: {e}")
         return pd.DataFrame()
 
-def save_loan_to_database(df):
+def save_loan_to_database(loan):
     try:
-        conn = sqlite3.connect('finance_data.db')
-        cursor = conn.cursor()
-        
-        # Create loans table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS loans
-        (Name TEXT, Amount REAL, Type TEXT, DueDate TEXT, User TEXT)
-        ''')
-        
-        df.to_sql('loans', conn, if_exists='append', index=False)
-        conn.close()
+        conn = get_conn()
+        with get_write_lock(), conn:
+            conn.execute('INSERT INTO loans (Name, Amount, Type, DueDate, User) VALUES (?, ?, ?, ?, ?)', loan)
+        read_loans.clear()
     except sqlite3.Error as e:
         st.error(f"An error occurred while saving the loan: {e}")
 
+@st.cache_data(ttl=600, show_spinner=False)
+def read_loans():
+    conn = get_read_conn()
+    return pd.read_sql('SELECT * FROM loans', conn)
+
 def load_loans_from_database():
     try:
-        conn = sqlite3.connect('finance_data.db')
-        cursor = conn.cursor()
-        
-        # Create loans table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS loans
-        (Name TEXT, Amount REAL, Type TEXT, DueDate TEXT, User TEXT)
-        ''')
-        
-        df = pd.read_sql('SELECT * FROM loans', conn)
-        conn.close()
-        return df
+        return read_loans()
     except sqlite3.Error as e:
         st.error(f"An error occurred while loading loans: {e}")
         return pd.DataFrame()